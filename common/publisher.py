@@ -0,0 +1,128 @@
+import os
+import threading
+import logging
+import paho.mqtt.client as paho
+
+from paho import mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+# one MQTT client, TLS connection and paho network thread per process,
+# shared by every metric published from it
+client = None
+
+# MQTTv5 topic aliases: each topic gets a fixed alias, its string is sent once
+# per network connection and later publishes only carry the 2-byte alias.
+# Only QoS 0 publishes use them: paho drops those on reconnect, but retransmits
+# unacknowledged QoS 1/2 packets unchanged on a connection that may not know the alias
+topic_aliases = {}
+alias_properties = {}
+announced_topics = set()
+alias_maximum = 0
+alias_lock = threading.Lock()
+
+# setting callbacks for different events to see if it works, print the message etc.
+def on_connect(client, userdata, flags, rc, properties=None):
+    global alias_maximum
+    logging.info("CONNACK received with code %s.", rc)
+
+    # aliases don't survive the network connection, even when the session does:
+    # announce the topics again, within the maximum this broker advertised
+    with alias_lock:
+        alias_maximum = getattr(properties, "TopicAliasMaximum", 0)
+        announced_topics.clear()
+
+# with this callback you can see if your publish was successful
+def on_publish(client, userdata, mid, properties=None):
+    logging.info("mid: %s", mid)
+
+# print which topic was subscribed to
+def on_subscribe(client, userdata, mid, granted_qos, properties=None):
+    logging.info("Subscribed: %s %s", mid, granted_qos)
+
+# print message, useful for checking if it was successful
+def on_message(client, userdata, msg):
+    logging.info("%s %s %s", msg.topic, msg.qos, msg.payload)
+
+def on_disconnect(client, userdata, rc):
+    global alias_maximum
+    # aliases die with the connection: publishes queued until the next CONNACK
+    # must carry their full topic
+    with alias_lock:
+        alias_maximum = 0
+        announced_topics.clear()
+
+    if rc != 0:
+        logging.warning("Unexpected MQTT disconnection. Code: %s", rc)
+    else:
+        logging.info("Disconnected from MQTT broker")
+
+def connect(client_id):
+    global client
+    if client is not None:
+        return client
+
+    # using MQTT version 5 here, for 3.1.1: MQTTv311, 3.1: MQTTv31
+    # userdata is user defined data of any type, updated by user_data_set()
+    # client_id is the given name of the client
+    client = paho.Client(client_id=client_id, userdata=None, protocol=paho.MQTTv5)
+    client.on_connect = on_connect
+    # let PUBACKs for batched publishes pipeline instead of stalling the loop
+    client.max_inflight_messages_set(20)
+
+    # enable TLS for secure connection
+    client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
+    # set username and password
+    client.username_pw_set(os.getenv("MQTT_USERNAME"), os.getenv("MQTT_PASSWORD"))
+    # keep the session (and its in-flight QoS 1 state) on the broker across reconnects
+    connect_properties = Properties(PacketTypes.CONNECT)
+    connect_properties.SessionExpiryInterval = 3600
+    # connect to HiveMQ Cloud on port 8883 (default for MQTT), a longer
+    # keepalive halves the PINGREQ/PINGRESP traffic of the default 60s
+    client.connect(
+        os.getenv("MQTT_CLUSTER_URL"),
+        8883,
+        keepalive=120,
+        clean_start=False,
+        properties=connect_properties
+    )
+
+    # setting callbacks, use separate functions like above for better visibility
+    client.on_subscribe = on_subscribe
+    client.on_message = on_message
+    client.on_publish = on_publish
+    client.on_disconnect = on_disconnect
+
+    client.loop_start()
+    return client
+
+def publish_metric(topic, payload, qos=1):
+    with alias_lock:
+        alias = topic_aliases.get(topic)
+        if alias is None:
+            alias = topic_aliases[topic] = len(topic_aliases) + 1
+            alias_properties[alias] = Properties(PacketTypes.PUBLISH)
+            alias_properties[alias].TopicAlias = alias
+
+        if qos > 0 or alias > alias_maximum:
+            return client.publish(topic, payload=payload, qos=qos)
+
+        # publish under the lock so the announcing publish is queued first
+        announced = topic in announced_topics
+        info = client.publish(
+            "" if announced else topic,
+            payload=payload,
+            qos=qos,
+            properties=alias_properties[alias]
+        )
+        # only a publish that was actually queued registers the alias
+        if info.rc == paho.MQTT_ERR_SUCCESS:
+            announced_topics.add(topic)
+        return info
+
+def disconnect():
+    global client
+    if client is not None:
+        client.loop_stop()
+        client.disconnect()
+        client = None
@@ -3,102 +3,60 @@ import os
 import psutil
 import threading
 import logging
-import json
-import paho.mqtt.client as paho
+import msgspec
+import publisher
 
-from paho import mqtt
 from dotenv import load_dotenv
 
 load_dotenv()
 
 log_level = os.getenv("LOG_LEVEL", "INFO").upper()
 
-sensor_id = os.getenv("SENSOR_ID")
+sensor_id = os.getenv("SENSOR_ID", "unknown")
 
 logging.basicConfig(
     level=log_level,
     format=f'%(asctime)s - {sensor_id} - %(levelname)s - %(message)s'
 )
 
+# fixed payload schema, encoded by a msgpack encoder specialized to the struct
+class CpuReading(msgspec.Struct):
+    timestamp: float
+    sensor_id: str
+    cpu_percent: float
+
+encoder = msgspec.msgpack.Encoder()
+
 def cpu_monitor():
 
-    publish_interval = int(os.getenv("PUBLISH_INTERVAL"))
+    # CPU_PUBLISH_INTERVAL takes precedence when both monitors share a process
+    publish_interval = int(os.getenv("CPU_PUBLISH_INTERVAL", os.getenv("PUBLISH_INTERVAL")))
 
     while True:
         cpu_percent = psutil.cpu_percent(interval=1)
 
-        logging.info(f"CPU Usage: {cpu_percent:.1f}%")
+        logging.info("CPU Usage: %.1f%%", cpu_percent)
 
-        cpu_data ={
-            "timestamp": time.time(),
-            "sensor_id": sensor_id,
-            "cpu_percent": cpu_percent
-        }
+        cpu_data = CpuReading(time.time(), sensor_id, cpu_percent)
 
         try:
-            client.publish(
-                "monitoring/cpu", 
-                payload=json.dumps(cpu_data), 
-                qos=1
-            )
+            publisher.publish_metric("monitoring/cpu", encoder.encode(cpu_data))
         except Exception as e:
-            logging.error(f"Failed to publish CPU data: {e}")
+            logging.error("Failed to publish CPU data: %s", e)
         
         time.sleep(publish_interval)
 
-# setting callbacks for different events to see if it works, print the message etc.
-def on_connect(client, userdata, flags, rc, properties=None):
-    logging.info(f"CONNACK received with code {rc}.")
-
-# with this callback you can see if your publish was successful
-def on_publish(client, userdata, mid, properties=None):
-    logging.info("mid: " + str(mid))
-
-# print which topic was subscribed to
-def on_subscribe(client, userdata, mid, granted_qos, properties=None):
-    logging.info("Subscribed: " + str(mid) + " " + str(granted_qos))
-
-# print message, useful for checking if it was successful
-def on_message(client, userdata, msg):
-    logging.info(msg.topic + " " + str(msg.qos) + " " + str(msg.payload))
-
-def on_disconnect(client, userdata, rc):
-    if rc != 0:
-        logging.warning(f"Unexpected MQTT disconnection. Code: {rc}")
-    else:
-        logging.info("Disconnected from MQTT broker")
-
-# using MQTT version 5 here, for 3.1.1: MQTTv311, 3.1: MQTTv31
-# userdata is user defined data of any type, updated by user_data_set()
-# client_id is the given name of the client
-client = paho.Client(client_id=f"{sensor_id}_cpu", userdata=None, protocol=paho.MQTTv5)
-client.on_connect = on_connect
-
-# enable TLS for secure connection
-client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
-# set username and password
-client.username_pw_set(os.getenv("MQTT_USERNAME"), os.getenv("MQTT_PASSWORD"))
-# connect to HiveMQ Cloud on port 8883 (default for MQTT)
-client.connect(os.getenv("MQTT_CLUSTER_URL"), 8883)
-
-# setting callbacks, use separate functions like above for better visibility
-client.on_subscribe = on_subscribe
-client.on_message = on_message
-client.on_publish = on_publish
-client.on_disconnect = on_disconnect
-
 if __name__=="__main__":
-    client.loop_start()
+    publisher.connect(f"{sensor_id}_cpu")
 
     try:
-        logging.info(f"Starting CPU monitoring")
+        logging.info("Starting CPU monitoring")
         cpu_monitor()
 
     except KeyboardInterrupt:
         logging.info("\nStopping CPU monitor...")
     except Exception as e:
-        logging.error(f"Error: {e}")
+        logging.error("Error: %s", e)
     finally:
-        client.loop_stop()
-        client.disconnect()
+        publisher.disconnect()
         logging.info("\nCPU sensor stopped")
@@ -3,101 +3,111 @@ import os
 import psutil
 import threading
 import logging
-import json
-import paho.mqtt.client as paho
+import msgspec
+import publisher
 
-from paho import mqtt
+from collections import deque
 from dotenv import load_dotenv
 
 load_dotenv()
 
 log_level = os.getenv("LOG_LEVEL", "INFO").upper()
 
-sensor_id = os.getenv("SENSOR_ID")
+sensor_id = os.getenv("SENSOR_ID", "unknown")
+
+# MEMORY_PUBLISH_INTERVAL overrides the shared interval in the combined sensors process
+publish_interval = int(os.getenv("MEMORY_PUBLISH_INTERVAL", os.getenv("PUBLISH_INTERVAL")))
+# samples are accumulated and published as a single msgpack array once
+# BATCH_SIZE readings are buffered, or LINGER_MS has elapsed since the last
+# flush when it is set; the default of 0 flushes on batch size alone
+batch_size = int(os.getenv("BATCH_SIZE", "1"))
+linger = int(os.getenv("LINGER_MS", "0")) / 1000
 
 logging.basicConfig(
     level=log_level,
     format=f'%(asctime)s - {sensor_id} - %(levelname)s - %(message)s'
 )
 
+# fixed payload schema, encoded by a msgpack encoder specialized to the struct
+class MemoryReading(msgspec.Struct):
+    timestamp: float
+    sensor_id: str
+    system_memory: float
+
+encoder = msgspec.msgpack.Encoder()
+
+# on Linux read /proc/meminfo directly, only the percentage is needed and
+# psutil.virtual_memory() parses every field into a new namedtuple each call
+try:
+    _meminfo = open("/proc/meminfo", "rb", buffering=0)
+except OSError:
+    _meminfo = None
+
+def _meminfo_kb(data, key):
+    start = data.find(key)
+    if start == -1:
+        return None
+    end = data.find(b"\n", start)
+    return int(data[start + len(key):end].split()[0])
+
+def read_memory_percent():
+    if _meminfo is not None:
+        _meminfo.seek(0)
+        data = _meminfo.read(256)
+        total = _meminfo_kb(data, b"MemTotal:")
+        available = _meminfo_kb(data, b"MemAvailable:")
+        if total and available is not None:
+            # same formula and rounding as psutil
+            return round((total - available) / total * 100, 1)
+
+    return psutil.virtual_memory().percent
+
 def memory_monitor():
 
-    publish_interval = int(os.getenv("PUBLISH_INTERVAL"))
+    _publish = publisher.publish_metric
+    _encode = encoder.encode
+    buffer = deque(maxlen=batch_size)
+    last_flush = time.monotonic()
+    # schedule against fixed deadlines so publish latency doesn't accumulate as drift
+    next_deadline = time.monotonic()
 
     while True:
-        system_memory = psutil.virtual_memory()
+        system_memory = read_memory_percent()
 
-        logging.info(f"System RAM: {system_memory.percent:.1f}%")
+        logging.info("System RAM: %.1f%%", system_memory)
 
-        memory_data ={
-            "timestamp": time.time(),
-            "sensor_id": sensor_id,
-            "system_memory": system_memory.percent
-        }
-        
-        try:
-            client.publish(
-                "monitoring/memory", 
-                payload=json.dumps(memory_data), 
-                qos=1
-            )
-        except Exception as e:
-            logging.error(f"Failed to publish memory data: {e}")
+        memory_data = MemoryReading(time.time(), sensor_id, system_memory)
+        buffer.append(memory_data)
+
+        if len(buffer) >= batch_size or 0 < linger <= time.monotonic() - last_flush:
+            # keep the single-object payload when batching is disabled
+            payload = memory_data if batch_size == 1 else list(buffer)
+
+            try:
+                _publish("monitoring/memory", _encode(payload))
+                buffer.clear()
+                last_flush = time.monotonic()
+            except Exception as e:
+                logging.error("Failed to publish memory data: %s", e)
         
-        time.sleep(publish_interval)
-
-# setting callbacks for different events to see if it works, print the message etc.
-def on_connect(client, userdata, flags, rc, properties=None):
-    logging.info(f"CONNACK received with code {rc}.")
-
-# with this callback you can see if your publish was successful
-def on_publish(client, userdata, mid, properties=None):
-    logging.info("mid: " + str(mid))
-
-# print which topic was subscribed to
-def on_subscribe(client, userdata, mid, granted_qos, properties=None):
-    logging.info("Subscribed: " + str(mid) + " " + str(granted_qos))
-
-# print message, useful for checking if it was successful
-def on_message(client, userdata, msg):
-    logging.info(msg.topic + " " + str(msg.qos) + " " + str(msg.payload))
-
-def on_disconnect(client, userdata, rc):
-    if rc != 0:
-        logging.warning(f"Unexpected MQTT disconnection. Code: {rc}")
-    else:
-        logging.info("Disconnected from MQTT broker")
-
-# using MQTT version 5 here, for 3.1.1: MQTTv311, 3.1: MQTTv31
-# userdata is user defined data of any type, updated by user_data_set()
-# client_id is the given name of the client
-client = paho.Client(client_id=f"{sensor_id}_memory", userdata=None, protocol=paho.MQTTv5)
-client.on_connect = on_connect
-
-# enable TLS for secure connection
-client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
-# set username and password
-client.username_pw_set(os.getenv("MQTT_USERNAME"), os.getenv("MQTT_PASSWORD"))
-# connect to HiveMQ Cloud on port 8883 (default for MQTT)
-client.connect(os.getenv("MQTT_CLUSTER_URL"), 8883)
-
-# setting callbacks, use separate functions like above for better visibility
-client.on_subscribe = on_subscribe
-client.on_message = on_message
-client.on_publish = on_publish
+        next_deadline += publish_interval
+        now = time.monotonic()
+        # after a stall, re-anchor instead of firing the missed samples back to back
+        if next_deadline < now:
+            next_deadline = now
+        time.sleep(next_deadline - now)
 
 if __name__=="__main__":
-    client.loop_start()
+    publisher.connect(f"{sensor_id}_memory")
 
     try:
-        logging.info(f"Starting memory monitoring")
+        logging.info("Starting memory monitoring")
         memory_monitor()
 
     except KeyboardInterrupt:
         logging.info("\nStopping memory monitor...")
     except Exception as e:
-        logging.error(f"Error: {e}")
+        logging.error("Error: %s", e)
     finally:
-        client.loop_stop()
-        client.disconnect()
+        publisher.disconnect()
         logging.info("\nmemory sensor stopped")
@@ -3,10 +3,10 @@ import os
 import psutil
 import threading
 import logging
-import json
-import paho.mqtt.client as paho
+import msgspec
+import gmqtt
 
-from paho import mqtt
+from gmqtt.mqtt.constants import MQTTv50
 from dotenv import load_dotenv
 from fastapi import FastAPI, Response, status
 from pydantic import BaseModel, Field
@@ -17,7 +17,7 @@ load_dotenv()
 
 log_level = os.getenv("LOG_LEVEL", "INFO").upper()
 
-messenger_id = os.getenv("MESSENGER_ID")
+messenger_id = os.getenv("MESSENGER_ID", "unknown")
 
 logging.basicConfig(
     level=log_level,
@@ -25,83 +25,79 @@ logging.basicConfig(
 )
 
 # setting callbacks for different events to see if it works, print the message etc.
-def on_connect(client, userdata, flags, rc, properties=None):
-    logging.info(f"CONNACK received with code {rc}.")
-
-# with this callback you can see if your publish was successful
-def on_publish(client, userdata, mid, properties=None):
-    logging.info("mid: " + str(mid))
+def on_connect(client, flags, rc, properties):
+    logging.info("CONNACK received with code %s.", rc)
 
 # print which topic was subscribed to
-def on_subscribe(client, userdata, mid, granted_qos, properties=None):
-    logging.info("Subscribed: " + str(mid) + " " + str(granted_qos))
+def on_subscribe(client, mid, granted_qos, properties):
+    logging.info("Subscribed: %s %s", mid, granted_qos)
 
 # print message, useful for checking if it was successful
-def on_message(client, userdata, msg):
-    logging.info(msg.topic + " " + str(msg.qos) + " " + str(msg.payload))
+def on_message(client, topic, payload, qos, properties):
+    logging.info("%s %s %s", topic, qos, payload)
 
-def on_disconnect(client, userdata, rc):
-    if rc != 0:
-        logging.warning(f"Unexpected MQTT disconnection. Code: {rc}")
+def on_disconnect(client, packet, exc=None):
+    if exc is not None:
+        logging.warning("Unexpected MQTT disconnection: %s", exc)
     else:
         logging.info("Disconnected from MQTT broker")
 
-# using MQTT version 5 here, for 3.1.1: MQTTv311, 3.1: MQTTv31
-# userdata is user defined data of any type, updated by user_data_set()
-# client_id is the given name of the client
-client = paho.Client(client_id=f"{messenger_id}", userdata=None, protocol=paho.MQTTv5)
-client.on_connect = on_connect
-
-# enable TLS for secure connection
-client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
-# set username and password
-client.username_pw_set(os.getenv("MQTT_USERNAME"), os.getenv("MQTT_PASSWORD"))
-# connect to HiveMQ Cloud on port 8883 (default for MQTT)
-client.connect(os.getenv("MQTT_CLUSTER_URL"), 8883)
+# gmqtt runs on the application's asyncio loop, no separate network thread;
+# client_id is the given name of the client, the session (and its in-flight
+# QoS 1 state) is kept on the broker across reconnects for an hour
+client = gmqtt.Client(
+    client_id=f"{messenger_id}", 
+    clean_session=False, 
+    session_expiry_interval=3600
+)
 
 # setting callbacks, use separate functions like above for better visibility
+client.on_connect = on_connect
 client.on_subscribe = on_subscribe
 client.on_message = on_message
-client.on_publish = on_publish
 client.on_disconnect = on_disconnect
 
+# set username and password
+client.set_auth_credentials(os.getenv("MQTT_USERNAME"), os.getenv("MQTT_PASSWORD"))
+
 class UserInput(BaseModel):
     message: str = Field(description="Message to be sent")
 
+# fixed payload schema, encoded by a msgpack encoder specialized to the struct
+class MessageData(msgspec.Struct):
+    timestamp: float
+    messenger_id: str
+    message: str
+
+encoder = msgspec.msgpack.Encoder()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    try:
-        client.loop_start()
-        logging.info(f"Starting messaging app")
+    # connect to HiveMQ Cloud on port 8883 over TLS, using MQTT version 5;
+    # a failed connect aborts startup with the original error
+    await client.connect(os.getenv("MQTT_CLUSTER_URL"), 8883, ssl=True, version=MQTTv50)
+    logging.info("Starting messaging app")
 
+    try:
         yield
-
-    except KeyboardInterrupt:
-        logging.info("\nStopping messaging app...")
-    except Exception as e:
-        logging.error(f"Error: {e}")
     finally:
-        client.loop_stop()
-        client.disconnect()
+        if client.is_connected:
+            await client.disconnect()
         logging.info("\nmessaging app stopped")
 
 app = FastAPI(lifespan=lifespan)
 
 @app.post("/")
 async def publish_message(input: UserInput):
-    message_data ={
-            "timestamp": time.time(),
-            "messenger_id": messenger_id,
-            "message": input.message
-        }
+    message_data = MessageData(time.time(), messenger_id, input.message)
     try:
+            # gmqtt only queues the packet on the loop's transport, it never blocks
             client.publish(
                 "monitoring/messages", 
-                payload=json.dumps(message_data), 
+                payload=encoder.encode(message_data), 
                 qos=1
             )
     except Exception as e:
-        logging.error(f"Failed to publish memory data: {e}")
+        logging.error("Failed to publish message data: %s", e)
 
     return Response(status_code=status.HTTP_200_OK)
-
@@ -0,0 +1,35 @@
+# Runs with the repository root and common/ on the import path, as the image
+# sets up; from a checkout: PYTHONPATH=.:common python sensors/main.py
+import time
+import threading
+import logging
+import publisher
+
+from cpu_sensor.main import cpu_monitor, sensor_id
+from memory_sensor.main import memory_monitor
+
+if __name__=="__main__":
+    # both metrics share this process's single MQTT connection
+    publisher.connect(f"{sensor_id}_sensors")
+
+    monitors = [
+        threading.Thread(target=cpu_monitor, name="cpu-monitor", daemon=True),
+        threading.Thread(target=memory_monitor, name="memory-monitor", daemon=True),
+    ]
+
+    try:
+        logging.info("Starting CPU and memory monitoring")
+        for monitor in monitors:
+            monitor.start()
+
+        # the monitors loop forever, stop if either of them dies
+        while all(monitor.is_alive() for monitor in monitors):
+            time.sleep(1)
+
+    except KeyboardInterrupt:
+        logging.info("\nStopping sensors...")
+    except Exception as e:
+        logging.error("Error: %s", e)
+    finally:
+        publisher.disconnect()
+        logging.info("\nsensors stopped")
@@ -1,11 +1,13 @@
 import streamlit as st
-import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 import paho.mqtt.client as paho
 from paho import mqtt
-import json
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+import msgspec
 import threading
 import time
 from datetime import datetime, timedelta
@@ -15,11 +17,20 @@ import logging
 from collections import deque
 import traceback
 
+from ingest import cpu_decoder, decode_records, memory_decoder, message_decoder
+
+# Numba compiles the statistics kernel; without it the plain NumPy version runs
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        return lambda func: func
+
 # Load environment variables
 load_dotenv()
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 # Streamlit page config
@@ -30,12 +41,63 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Last formatted second, messages usually arrive in bursts within the same second
+_last_clock = (None, "")
+
+def format_clock(timestamp):
+    """Format a unix timestamp as HH:MM:SS, reusing the previous result within the same second"""
+    global _last_clock
+    sec = int(timestamp)
+    if sec != _last_clock[0]:
+        _last_clock = (sec, time.strftime("%H:%M:%S", time.localtime(sec)))
+    return _last_clock[1]
+
+@njit(cache=True, fastmath=True)
+def series_stats(values):
+    """Mean, max and standard deviation of a non-empty float32 array"""
+    return values.mean(), values.max(), values.std()
+
+# One sensor reading: unix timestamp, percentage and index into the sensor id table
+READING_DTYPE = np.dtype([('ts', 'f8'), ('val', 'f4'), ('sensor', 'u2')])
+
+class ReadingRingBuffer:
+    """Fixed-size ring buffer of sensor readings stored in a structured array.
+    
+    Single producer (the paho thread) and single consumer (the Streamlit thread),
+    so no lock: the producer fills a slot before publishing it by bumping count.
+    One slot more than the capacity is allocated, so the slot being written is
+    never among the readings a snapshot copies.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.slots = capacity + 1
+        self.buffer = np.empty(self.slots, dtype=READING_DTYPE)
+        self.count = 0
+    
+    def append(self, timestamp, value, sensor):
+        self.buffer[self.count % self.slots] = (timestamp, value, sensor)
+        self.count += 1
+    
+    def snapshot(self):
+        """Copy of the stored readings in insertion order"""
+        count = self.count
+        start = max(0, count - self.capacity)
+        data = self.buffer[np.arange(start, count) % self.slots]
+        # Drop readings the producer overwrote while copying: it may be writing
+        # position self.count, which reuses the slot of position self.count - slots
+        first_valid = self.count + 1 - self.slots
+        return data[first_valid - start:] if first_valid > start else data
+
 class MQTTHandler:
     def __init__(self):
         self.client = None
-        # Thread-safe data storage
-        self.memory_data = deque(maxlen=100)
-        self.cpu_data = deque(maxlen=100)
+        # Lock-free storage for the numeric readings
+        self.memory_data = ReadingRingBuffer(100)
+        self.cpu_data = ReadingRingBuffer(100)
+        # Sensor ids are stored once and referenced by index from the readings
+        self.sensor_index = {}
+        self.sensor_ids = []
+        # Messages and errors are guarded by data_lock
         self.messages = deque(maxlen=50)
         self.connected = False
         self.connection_errors = []
@@ -60,54 +122,54 @@ class MQTTHandler:
                 logger.error(error_msg)
                 self.connection_errors.append(f"{datetime.now()}: {error_msg}")
         
+        def process_memory(reading):
+            self.memory_data.append(reading.timestamp, reading.system_memory, self.sensor_slot(reading.sensor_id))
+            logger.info("Added memory data point: %s %s", reading.sensor_id, reading.system_memory)
+        
+        def process_cpu(reading):
+            self.cpu_data.append(reading.timestamp, reading.cpu_percent, self.sensor_slot(reading.sensor_id))
+            logger.info("Added CPU data point: %s %s", reading.sensor_id, reading.cpu_percent)
+        
+        def process_message(payload):
+            message_data = {
+                'timestamp': datetime.fromtimestamp(payload.timestamp),
+                'time': format_clock(payload.timestamp),
+                'messenger_id': payload.messenger_id,
+                'message': payload.message
+            }
+            with self.data_lock:
+                self.messages.append(message_data)
+            logger.info("Added message: %s", message_data)
+        
+        # Topic dispatch table, looked up once per message
+        handlers = {
+            "monitoring/memory": (memory_decoder, process_memory),
+            "monitoring/cpu": (cpu_decoder, process_cpu),
+            "monitoring/messages": (message_decoder, process_message),
+        }
+
         def on_message(client, userdata, msg):
             try:
                 topic = msg.topic
-                payload = json.loads(msg.payload.decode())
-                timestamp = datetime.fromtimestamp(payload.get('timestamp', time.time()))
+                route = handlers.get(topic)
+                if route is None:
+                    return
+                decoder, handler = route
+                
+                try:
+                    records = decode_records(decoder, msg.payload)
+                except msgspec.DecodeError as e:
+                    # Malformed payloads and missing or mistyped fields
+                    error_msg = f"Payload decode error: {e}, payload: {msg.payload}"
+                    logger.error(error_msg)
+                    self.connection_errors.append(f"{datetime.now()}: {error_msg}")
+                    return
                 
-                logger.info(f"Received message on {topic}: {payload}")
+                logger.info("Received message on %s: %s", topic, records)
                 
-                # Use thread-safe operations
-                with self.data_lock:
-                    if topic == "monitoring/memory":
-                        # Check if required fields exist
-                        if 'system_memory' in payload:
-                            data_point = {
-                                'timestamp': timestamp,
-                                'sensor_id': payload.get('sensor_id', 'unknown'),
-                                'memory_percent': float(payload.get('system_memory', 0))
-                            }
-                            self.memory_data.append(data_point)
-                            logger.info(f"Added memory data point: {data_point}")
-                        else:
-                            logger.warning(f"Missing 'system_memory' field in payload: {payload}")
-                            
-                    elif topic == "monitoring/cpu":
-                        if 'cpu_percent' in payload:
-                            data_point = {
-                                'timestamp': timestamp,
-                                'sensor_id': payload.get('sensor_id', 'unknown'),
-                                'cpu_percent': float(payload.get('cpu_percent', 0))
-                            }
-                            self.cpu_data.append(data_point)
-                            logger.info(f"Added CPU data point: {data_point}")
-                        else:
-                            logger.warning(f"Missing 'cpu_percent' field in payload: {payload}")
-                            
-                    elif topic == "monitoring/messages":
-                        message_data = {
-                            'timestamp': timestamp,
-                            'messenger_id': payload.get('messenger_id', 'unknown'),
-                            'message': payload.get('message', 'No message')
-                        }
-                        self.messages.append(message_data)
-                        logger.info(f"Added message: {message_data}")
+                for record in records:
+                    handler(record)
                         
-            except json.JSONDecodeError as e:
-                error_msg = f"JSON decode error: {e}, payload: {msg.payload}"
-                logger.error(error_msg)
-                self.connection_errors.append(f"{datetime.now()}: {error_msg}")
             except Exception as e:
                 error_msg = f"Error processing message: {e}, traceback: {traceback.format_exc()}"
                 logger.error(error_msg)
@@ -159,7 +221,15 @@ class MQTTHandler:
                 self.connection_errors.append(f"{datetime.now()}: {error_msg}")
                 return False
                 
-            self.client.connect(mqtt_url, 8883, 60)
+            # keep the session on the broker so QoS 1 readings published while
+            # the dashboard is disconnected are delivered when it reconnects
+            connect_properties = Properties(PacketTypes.CONNECT)
+            connect_properties.SessionExpiryInterval = 3600
+            self.client.connect(
+                mqtt_url, 8883, 60,
+                clean_start=False,
+                properties=connect_properties
+            )
             self.client.loop_start()
             return True
         except Exception as e:
@@ -168,17 +238,38 @@ class MQTTHandler:
             self.connection_errors.append(f"{datetime.now()}: {error_msg}")
             return False
     
+    def sensor_slot(self, sensor_id):
+        """Index of sensor_id in the sensor id table, registering it on first use"""
+        slot = self.sensor_index.get(sensor_id)
+        if slot is None:
+            slot = self.sensor_index[sensor_id] = len(self.sensor_ids)
+            self.sensor_ids.append(sensor_id)
+        return slot
+    
     def get_data(self):
         """Thread-safe method to get current data"""
+        memory_data = self.memory_data.snapshot()
+        cpu_data = self.cpu_data.snapshot()
+        # Sensor ids are registered before their readings, so copy them last
+        sensor_ids = list(self.sensor_ids)
         with self.data_lock:
             return {
-                'memory_data': list(self.memory_data),
-                'cpu_data': list(self.cpu_data), 
+                'memory_data': memory_data,
+                'cpu_data': cpu_data, 
+                'sensor_ids': sensor_ids,
                 'messages': list(self.messages),
                 'connected': self.connected,
                 'errors': list(self.connection_errors[-10:])  # Last 10 errors
             }
     
+    def memory_array_view(self):
+        """Copy of the memory percentages as a contiguous float32 array"""
+        return np.ascontiguousarray(self.memory_data.snapshot()['val'])
+    
+    def cpu_array_view(self):
+        """Copy of the CPU percentages as a contiguous float32 array"""
+        return np.ascontiguousarray(self.cpu_data.snapshot()['val'])
+    
     def disconnect(self):
         if self.client:
             self.client.loop_stop()
@@ -193,6 +284,7 @@ if 'mqtt_handler' not in st.session_state:
         logger.error("Failed to initialize MQTT connection")
 
 # Helper functions
+@st.cache_data(max_entries=16)
 def create_gauge_chart(value, title, max_value=100, color_threshold=80):
     """Create a gauge chart for metrics"""
     try:
@@ -222,7 +314,7 @@ def create_gauge_chart(value, title, max_value=100, color_threshold=80):
         fig.update_layout(height=300)
         return fig
     except Exception as e:
-        logger.error(f"Error creating gauge chart: {e}")
+        logger.error("Error creating gauge chart: %s", e)
         # Return a simple figure with error message
         fig = go.Figure()
         fig.add_annotation(
@@ -232,10 +324,23 @@ def create_gauge_chart(value, title, max_value=100, color_threshold=80):
         )
         return fig
 
-def create_time_series_chart(data, y_column, title, color):
-    """Create time series chart"""
+def series_cache_key(data):
+    """Identify a bounded series by its length and newest timestamp"""
+    return (len(data), float(data[-1]['ts'])) if len(data) else None
+
+def describe_reading(reading, sensor_ids, value_key):
+    """Readable dict for a single structured reading"""
+    return {
+        'timestamp': datetime.fromtimestamp(reading['ts']),
+        'sensor_id': sensor_ids[reading['sensor']],
+        value_key: round(float(reading['val']), 1)
+    }
+
+@st.cache_data(max_entries=16)
+def create_time_series_chart(_data, cache_key, title, color):
+    """Create time series chart, cached on cache_key instead of hashing the data"""
     try:
-        if not data:
+        if not len(_data):
             fig = go.Figure()
             fig.add_annotation(
                 text="No data available", 
@@ -245,23 +350,13 @@ def create_time_series_chart(data, y_column, title, color):
             fig.update_layout(title=title, height=400)
             return fig
         
-        df = pd.DataFrame(data)
-        
-        # Ensure the column exists
-        if y_column not in df.columns:
-            fig = go.Figure()
-            fig.add_annotation(
-                text=f"Column '{y_column}' not found in data", 
-                xref="paper", yref="paper", 
-                x=0.5, y=0.5, showarrow=False
-            )
-            fig.update_layout(title=title, height=400)
-            return fig
+        xs = [datetime.fromtimestamp(ts) for ts in _data['ts'].tolist()]
+        ys = _data['val']
         
         fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=df['timestamp'],
-            y=df[y_column],
+        fig.add_trace(go.Scattergl(
+            x=xs,
+            y=ys,
             mode='lines+markers',
             name=title,
             line=dict(color=color, width=2),
@@ -278,7 +373,7 @@ def create_time_series_chart(data, y_column, title, color):
         
         return fig
     except Exception as e:
-        logger.error(f"Error creating time series chart: {e}")
+        logger.error("Error creating time series chart: %s", e)
         fig = go.Figure()
         fig.add_annotation(
             text=f"Error creating chart: {str(e)}", 
@@ -288,6 +383,82 @@ def create_time_series_chart(data, y_column, title, color):
         fig.update_layout(title=title, height=400)
         return fig
 
+def live_panel():
+    """Gauges and time series, refreshed as a Streamlit fragment"""
+    handler = st.session_state.mqtt_handler
+    # One snapshot per buffer feeds both the gauge and the series beside it
+    memory_data = handler.memory_data.snapshot()
+    cpu_data = handler.cpu_data.snapshot()
+    
+    col1, col2 = st.columns(2)
+    
+    # Current metrics
+    current_memory = float(memory_data['val'][-1]) if len(memory_data) else 0
+    current_cpu = float(cpu_data['val'][-1]) if len(cpu_data) else 0
+    
+    with col1:
+        st.subheader("💾 Uso de Memoria")
+        fig_memory_gauge = create_gauge_chart(current_memory, "% Memoria", color_threshold=75)
+        st.plotly_chart(fig_memory_gauge, use_container_width=True, key="memory_gauge")
+    
+    with col2:
+        st.subheader("⚡ Uso de CPU") 
+        fig_cpu_gauge = create_gauge_chart(current_cpu, "% CPU", color_threshold=70)
+        st.plotly_chart(fig_cpu_gauge, use_container_width=True, key="cpu_gauge")
+    
+    # Time series charts
+    col3, col4 = st.columns(2)
+    
+    with col3:
+        st.subheader("📈 Historial de uso de memoria")
+        fig_memory_time = create_time_series_chart(
+            memory_data, 
+            series_cache_key(memory_data), 
+            'Uso de memoria a través del tiempo',
+            '#FF6B6B'
+        )
+        st.plotly_chart(fig_memory_time, use_container_width=True, key="memory_time")
+    
+    with col4:
+        st.subheader("📈 Historial de uso de CPU")
+        fig_cpu_time = create_time_series_chart(
+            cpu_data, 
+            series_cache_key(cpu_data), 
+            'Uso de CPU a través del tiempo', 
+            '#4ECDC4'
+        )
+        st.plotly_chart(fig_cpu_time, use_container_width=True, key="cpu_time")
+
+def live_statistics():
+    """Summary metrics, refreshed as a Streamlit fragment"""
+    handler = st.session_state.mqtt_handler
+    memory_values = handler.memory_array_view()
+    cpu_values = handler.cpu_array_view()
+    
+    st.subheader("📊 Estadísticas")
+    
+    col_stat1, col_stat2, col_stat3, col_stat4 = st.columns(4)
+    
+    with col_stat1:
+        if memory_values.size:
+            avg_memory, max_memory, std_memory = series_stats(memory_values)
+            st.metric("% Memoria promedio", f"{avg_memory:.1f}", help=f"Máximo: {max_memory:.1f} · Desviación: {std_memory:.1f}")
+        else:
+            st.metric("% Memoria promedio", f"{0:.1f}")
+    
+    with col_stat2:
+        if cpu_values.size:
+            avg_cpu, max_cpu, std_cpu = series_stats(cpu_values)
+            st.metric("% CPU promedio", f"{avg_cpu:.1f}", help=f"Máximo: {max_cpu:.1f} · Desviación: {std_cpu:.1f}")
+        else:
+            st.metric("% CPU promedio", f"{0:.1f}")
+    
+    with col_stat3:
+        st.metric("Lecturas de memoria", memory_values.size)
+    
+    with col_stat4:
+        st.metric("Lecturas de CPU", cpu_values.size)
+
 # Main app
 def main():
     st.title("📊 Tablero de monitoreo")
@@ -298,6 +469,7 @@ def main():
         mqtt_data = st.session_state.mqtt_handler.get_data()
         memory_data = mqtt_data['memory_data']
         cpu_data = mqtt_data['cpu_data']
+        sensor_ids = mqtt_data['sensor_ids']
         messages = mqtt_data['messages']
         mqtt_connected = mqtt_data['connected']
         connection_errors = mqtt_data['errors']
@@ -309,10 +481,10 @@ def main():
             st.write(f"**Mensajes:** {len(messages)}")
             st.write(f"**MQTT Conectado:** {mqtt_connected}")
             
-            if memory_data:
-                st.write("**Última información de memoria:**", memory_data[-1])
-            if cpu_data:
-                st.write("**última información de CPU:**", cpu_data[-1])
+            if len(memory_data):
+                st.write("**Última información de memoria:**", describe_reading(memory_data[-1], sensor_ids, 'memory_percent'))
+            if len(cpu_data):
+                st.write("**última información de CPU:**", describe_reading(cpu_data[-1], sensor_ids, 'cpu_percent'))
                 
             if connection_errors:
                 st.error("**Recent Errors:**")
@@ -349,60 +521,22 @@ def main():
         if st.button("🔄 Actualizar ahora"):
             st.rerun()
     
-    # Main dashboard
-    col1, col2 = st.columns(2)
-    
-    # Current metrics
-    current_memory = memory_data[-1]['memory_percent'] if memory_data else 0
-    current_cpu = cpu_data[-1]['cpu_percent'] if cpu_data else 0
-    
-    with col1:
-        st.subheader("💾 Uso de Memoria")
-        fig_memory_gauge = create_gauge_chart(current_memory, "% Memoria", color_threshold=75)
-        st.plotly_chart(fig_memory_gauge, use_container_width=True)
-    
-    with col2:
-        st.subheader("⚡ Uso de CPU") 
-        fig_cpu_gauge = create_gauge_chart(current_cpu, "% CPU", color_threshold=70)
-        st.plotly_chart(fig_cpu_gauge, use_container_width=True)
-    
-    # Time series charts
-    col3, col4 = st.columns(2)
-    
-    with col3:
-        st.subheader("📈 Historial de uso de memoria")
-        fig_memory_time = create_time_series_chart(
-            memory_data, 
-            'memory_percent', 
-            'Uso de memoria a través del tiempo',
-            '#FF6B6B'
-        )
-        st.plotly_chart(fig_memory_time, use_container_width=True)
-    
-    with col4:
-        st.subheader("📈 Historial de uso de CPU")
-        fig_cpu_time = create_time_series_chart(
-            cpu_data, 
-            'cpu_percent', 
-            'Uso de CPU a través del tiempo', 
-            '#4ECDC4'
-        )
-        st.plotly_chart(fig_cpu_time, use_container_width=True)
+    # Live panels rerun on their own, without replaying the whole script
+    run_every = refresh_interval if auto_refresh else None
+    st.fragment(live_panel, run_every=run_every)()
     
     # Messages section
     st.subheader("💬 Mensajes recientes")
     
     if messages:
-        messages_df = pd.DataFrame(messages)
-        messages_df['timestamp'] = pd.to_datetime(messages_df['timestamp'])
-        messages_df = messages_df.sort_values('timestamp', ascending=False)
+        recent_messages = sorted(messages, key=lambda m: m['timestamp'], reverse=True)
         
         # Display messages in a nice format
-        for _, message in messages_df.head(10).iterrows():
+        for message in recent_messages[:10]:
             with st.container():
                 col_time, col_id, col_msg = st.columns([2, 2, 6])
                 with col_time:
-                    st.caption(message['timestamp'].strftime("%H:%M:%S"))
+                    st.caption(message['time'])
                 with col_id:
                     st.caption(f"ID: {message['messenger_id']}")
                 with col_msg:
@@ -411,29 +545,7 @@ def main():
     else:
         st.info("No se han recibido mensajes.")
     
-    # Statistics
-    st.subheader("📊 Estadísticas")
-    
-    col_stat1, col_stat2, col_stat3, col_stat4 = st.columns(4)
-    
-    with col_stat1:
-        avg_memory = sum(d['memory_percent'] for d in memory_data) / len(memory_data) if memory_data else 0
-        st.metric("% Memoria promedio", f"{avg_memory:.1f}")
-    
-    with col_stat2:
-        avg_cpu = sum(d['cpu_percent'] for d in cpu_data) / len(cpu_data) if cpu_data else 0
-        st.metric("% CPU promedio", f"{avg_cpu:.1f}")
-    
-    with col_stat3:
-        st.metric("Lecturas de memoria", len(memory_data))
-    
-    with col_stat4:
-        st.metric("Lecturas de CPU", len(cpu_data))
-    
-    # Auto refresh at the end to avoid blocking
-    if auto_refresh:
-        time.sleep(refresh_interval)
-        st.rerun()
+    st.fragment(live_statistics, run_every=run_every)()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
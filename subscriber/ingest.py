@@ -0,0 +1,21 @@
+# Payload decoding for the dashboard's MQTT callbacks.
+# Kept free of paho and Streamlit so the Docker build can compile it with mypyc;
+# without a compiled build this module is imported as plain Python.
+import msgspec
+
+from typing import Union
+
+from schema import CpuReading, MemoryReading, MessageData
+
+# Sensors may publish a batch of readings as an array
+memory_decoder = msgspec.msgpack.Decoder(Union[MemoryReading, list[MemoryReading]])
+cpu_decoder = msgspec.msgpack.Decoder(Union[CpuReading, list[CpuReading]])
+message_decoder = msgspec.msgpack.Decoder(Union[MessageData, list[MessageData]])
+
+
+def decode_records(decoder: msgspec.msgpack.Decoder, payload: bytes) -> list:
+    """Decode a payload into a list of records, whether it holds one or an array"""
+    decoded = decoder.decode(payload)
+    if isinstance(decoded, list):
+        return decoded
+    return [decoded]
@@ -0,0 +1,24 @@
+# Payload schemas shared by the dashboard's decoders.
+# Kept out of ingest.py: mypyc would compile these into native classes and
+# reject msgspec's field() defaults.
+import time
+
+import msgspec
+
+
+class MemoryReading(msgspec.Struct):
+    system_memory: float
+    timestamp: float = msgspec.field(default_factory=time.time)
+    sensor_id: str = 'unknown'
+
+
+class CpuReading(msgspec.Struct):
+    cpu_percent: float
+    timestamp: float = msgspec.field(default_factory=time.time)
+    sensor_id: str = 'unknown'
+
+
+class MessageData(msgspec.Struct):
+    timestamp: float = msgspec.field(default_factory=time.time)
+    messenger_id: str = 'unknown'
+    message: str = 'No message'